@@ -0,0 +1,616 @@
+'''Benchmark suite with regression tracking.
+
+Scenarios from performance_test.ipynb and parameterized benchmarks of library
+functions. Time and peak memory of each benchmark are written to JSON and
+compared against stored baseline.
+
+Usage
+-----
+python benchmarks.py --sizes 1000 100000 --output bench.json
+python benchmarks.py --baseline bench_baseline.json --save-baseline
+python benchmarks.py --baseline bench_baseline.json --filter utils.
+'''
+import argparse
+import itertools
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+import tracemalloc
+from string import ascii_lowercase, ascii_uppercase
+
+import numpy as np
+import pandas as pd
+
+DEFAULT_SIZES = (1000, 10000, 100000)
+
+#absolute differences below noise level are not regressions
+NOISE = {'time': 1e-5, 'peak_memory': 1024}
+
+BENCHMARKS = {}
+
+def benchmark(name, sized=True, memory=True):
+    '''
+    Register benchmark.
+
+    Decorated function takes size (if sized) and returns callable to measure,
+    so data generation is excluded from measurement. Optional cleanup
+    attribute of returned callable is called after measurement.
+
+    Parameters
+    ----------
+    name : str
+    sized : bool
+    If True benchmark runs for each of data sizes.
+    memory : bool
+    If False peak memory is not measured, e.g. for work in subprocess
+    which is not visible to tracemalloc.
+    '''
+    def register(setup):
+        BENCHMARKS[name] = (setup, sized, memory)
+        return setup
+    return register
+
+def measure(func, repeat=3, memory=True):
+    '''
+    Measure wall time and peak memory of callable.
+
+    Parameters
+    ----------
+    func : callable without arguments
+    repeat : int
+    Number of timed runs, best time is taken.
+    memory : bool
+    Measure peak memory.
+
+    Returns
+    -------
+    result : dict
+    'time' in seconds, 'peak_memory' in bytes or None if not measured.
+    '''
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - start)
+
+    if not memory:
+        return {'time': min(times), 'peak_memory': None}
+
+    #separate run, tracemalloc slows down execution
+    tracemalloc.start()
+    try:
+        func()
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+    return {'time': min(times), 'peak_memory': peak}
+
+def run(sizes=DEFAULT_SIZES, repeat=3, name_filter=None):
+    '''
+    Run registered benchmarks.
+
+    Parameters
+    ----------
+    sizes : list of int
+    repeat : int
+    name_filter : str, optional
+    Substring of benchmark name.
+
+    Returns
+    -------
+    results : dict
+    Keys are 'name[size]' or 'name', values are measure() results.
+    Skipped benchmarks have 'skipped' key with reason,
+    failed benchmarks have 'error' key with exception.
+    '''
+    results = {}
+    for name, (setup, sized, memory) in BENCHMARKS.items():
+        if name_filter and name_filter not in name:
+            continue
+
+        for size in sizes if sized else [None]:
+            key = name if size is None else '%s[%d]' % (name, size)
+            try:
+                func = setup() if size is None else setup(size)
+            except ImportError as e:
+                results[key] = {'skipped': str(e)}
+                print('%-64s skipped: %s' % (key, e))
+                continue
+
+            #failure of single benchmark does not abort the suite
+            try:
+                results[key] = measure(func, repeat=repeat, memory=memory)
+            except Exception as e:
+                results[key] = {'error': '%s: %s' % (type(e).__name__, e)}
+                print('%-64s error: %s' % (key, results[key]['error']))
+                continue
+            finally:
+                #resources of setup, e.g. temporary directories
+                if hasattr(func, 'cleanup'):
+                    func.cleanup()
+
+            peak = results[key]['peak_memory']
+            print('%-64s %12.6f s %14s B' % (
+                key, results[key]['time'], '-' if peak is None else peak))
+
+    return results
+
+def compare(results, baseline, threshold=0.2):
+    '''
+    Compare results with baseline.
+
+    Parameters
+    ----------
+    results : dict
+    baseline : dict
+    threshold : float
+    Allowed relative increase of time or peak memory.
+
+    Returns
+    -------
+    regressions : list of tuples (key, metric, baseline value, value)
+    '''
+    regressions = []
+    for key, res in results.items():
+        base = baseline.get(key)
+        if base is None or 'time' not in res or 'time' not in base:
+            continue
+        for metric in ('time', 'peak_memory'):
+            if res.get(metric) is None or base.get(metric) is None:
+                continue
+            if res[metric] > base[metric] * (1 + threshold) + NOISE[metric]:
+                regressions.append((key, metric, base[metric], res[metric]))
+
+    return regressions
+
+def environment():
+    '''Versions of interpreter and main dependencies.'''
+    return {
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'pandas': pd.__version__,
+        'machine': platform.machine(),
+    }
+
+#performance_test.ipynb scenarios
+
+@benchmark('relu.clip')
+def relu_clip(size):
+    raw = np.random.randint(-10, 100, (size, 40)) / 10
+    return lambda: raw.clip(0, raw.max())
+
+@benchmark('relu.mask')
+def relu_mask(size):
+    raw = np.random.randint(-10, 100, (size, 40)) / 10
+    def relu():
+        res = raw.copy()
+        res[res < 0] = 0
+    return relu
+
+def _levels():
+    asc = {ascii_lowercase[i]: i for i in range(26)}
+    desc = {ascii_lowercase[25 - i]: i for i in range(26)}
+    asc_levels = {'desc': desc, 'asc': asc}
+    desc_levels = {k: {'desc': desc[k], 'asc': asc[k]} for k in asc.keys()}
+    return asc_levels, desc_levels
+
+@benchmark('dict_levels.outer_small.iterate', sized=False)
+def dict_outer_small_iterate():
+    levels = _levels()[0]
+    return lambda: [j * 2 for i in levels for j in levels]
+
+@benchmark('dict_levels.outer_small.getitem', sized=False)
+def dict_outer_small_getitem():
+    levels = _levels()[0]
+    return lambda: levels['desc']['v']
+
+@benchmark('dict_levels.outer_large.iterate', sized=False)
+def dict_outer_large_iterate():
+    levels = _levels()[1]
+    return lambda: [j * 2 for i in levels for j in levels]
+
+@benchmark('dict_levels.outer_large.getitem', sized=False)
+def dict_outer_large_getitem():
+    levels = _levels()[1]
+    return lambda: levels['v']['asc']
+
+def _replace_data(size):
+    mn = dict(zip(['янв', 'фев', 'мар', 'апр', 'май', 'июн',
+                   'июл', 'авг', 'сен', 'окт', 'ноя', 'дек'],
+                  ['%02d' % i for i in range(1, 13)]))
+    d = {'-'.join([str(y), m, str(day)]): '-'.join([str(y), mn[m], str(day)])
+         for y, m, day in itertools.product(range(2010, 2020), mn, range(1, 31))}
+    a = np.random.choice(list(d.keys()), size)
+    return a, d
+
+@benchmark('dict_replace.list')
+def dict_replace_list(size):
+    a, d = _replace_data(size)
+    return lambda: [d[k] for k in a.tolist()]
+
+@benchmark('dict_replace.vectorize')
+def dict_replace_vectorize(size):
+    a, d = _replace_data(size)
+    v_replace = np.vectorize(lambda k: d[k])
+    return lambda: v_replace(a)
+
+@benchmark('dict_replace.unique_inverse')
+def dict_replace_unique_inverse(size):
+    a, d = _replace_data(size)
+    def replace():
+        val, inv = np.unique(a, return_inverse=True)
+        return np.array([d[k] for k in val])[inv]
+    return replace
+
+@benchmark('dict_replace.fromiter')
+def dict_replace_fromiter(size):
+    a, d = _replace_data(size)
+    return lambda: np.fromiter(map(lambda x: d[x], a), dtype=a.dtype)
+
+#utils
+
+def _timeseries(size, columns=None):
+    idx = pd.date_range(start='2019-01-01', periods=size, freq='10min')
+    if columns is None:
+        return pd.Series(np.random.rand(size), index=idx)
+    cols = list(ascii_uppercase)[:columns]
+    return pd.DataFrame(np.random.rand(size, columns), index=idx, columns=cols)
+
+@benchmark('utils.time_derivative')
+def utils_time_derivative(size):
+    import utils
+    series = _timeseries(size)
+    return lambda: utils.time_derivative(series)
+
+@benchmark('utils.convert_cyr_month')
+def utils_convert_cyr_month(size):
+    import utils
+    months = pd.Series(np.random.choice(
+        ['январь', 'февраль', 'март', 'апрель', 'май', 'июнь'], size))
+    return lambda: utils.convert_cyr_month(months)
+
+@benchmark('utils.timeseries_info')
+def utils_timeseries_info(size):
+    import utils
+    series = _timeseries(size)
+    return lambda: utils.timeseries_info(series)
+
+@benchmark('utils.bool_report')
+def utils_bool_report(size):
+    import utils
+    series = pd.Series(np.random.rand(size) > 0.5)
+    return lambda: utils.bool_report(series)
+
+@benchmark('utils.floating_filter')
+def utils_floating_filter(size):
+    import utils
+    df = pd.DataFrame(np.arange(size * 4).reshape(size, 4))
+    return lambda: utils.floating_filter(df, size)
+
+@benchmark('utils.columnwise_rolling')
+def utils_columnwise_rolling(size):
+    import utils
+    df = _timeseries(size, columns=10)
+    windows = pd.Series(range(1, df.columns.size + 1), index=df.columns)
+    return lambda: utils.columnwise_rolling(df, windows, 'mean')
+
+@benchmark('utils.columnwise_shift')
+def utils_columnwise_shift(size):
+    import utils
+    df = _timeseries(size, columns=10)
+    offsets = pd.Series(range(df.columns.size), index=df.columns)
+    return lambda: utils.columnwise_shift(df, offsets, 'h')
+
+@benchmark('utils.recursive_set')
+def utils_recursive_set(size):
+    import utils
+    nested = np.random.randint(0, 100, (size // 10 + 1, 10)).tolist()
+    return lambda: utils.recursive_set(nested)
+
+@benchmark('utils.recursive_flatten')
+def utils_recursive_flatten(size):
+    import utils
+    nested = np.random.randint(0, 100, (size // 10 + 1, 10)).tolist()
+    return lambda: utils.recursive_flatten(nested)
+
+@benchmark('utils.hash_df')
+def utils_hash_df(size):
+    import utils
+    df = _timeseries(size, columns=10)
+    return lambda: utils.hash_df(df)
+
+@benchmark('utils.regroup_dict')
+def utils_regroup_dict(size):
+    import utils
+    d = {i: set(np.random.randint(0, 100, 5).tolist()) for i in range(size // 5 + 1)}
+    return lambda: utils.regroup_dict(d)
+
+@benchmark('utils.subseries_count')
+def utils_subseries_count(size):
+    import utils
+    a = np.random.rand(size) > 0.5
+    return lambda: utils.subseries_count(a)
+
+@benchmark('utils.nondecr_subarray_len')
+def utils_nondecr_subarray_len(size):
+    import utils
+    a = np.random.rand(size)
+    return lambda: utils.nondecr_subarray_len(a)
+
+@benchmark('utils.value_subarray_len')
+def utils_value_subarray_len(size):
+    import utils
+    a = np.random.randint(0, 3, size)
+    return lambda: utils.value_subarray_len(a, 0)
+
+@benchmark('utils.const_check')
+def utils_const_check(size):
+    import utils
+    a = np.ones(size)
+    a[::7] = np.nan
+    return lambda: utils.const_check(a)
+
+def _counts(size):
+    counts = np.random.randint(1, 20, size // 10 + 1)
+    return pd.Series(counts, index=np.arange(counts.size) * 10)
+
+@benchmark('utils.inverse_agg_count')
+def utils_inverse_agg_count(size):
+    import utils
+    counts = _counts(size)
+    return lambda: utils.inverse_agg_count(counts)
+
+@benchmark('utils.iter_inverse_agg_count')
+def utils_iter_inverse_agg_count(size):
+    import utils
+    counts = _counts(size)
+    return lambda: [c for c in utils.iter_inverse_agg_count(counts, chunk_size=10000)]
+
+@benchmark('utils.repeat_range')
+def utils_repeat_range(size):
+    import utils
+    repeats = _counts(size).values
+    return lambda: utils.repeat_range(repeats)
+
+@benchmark('utils.iter_repeat_range')
+def utils_iter_repeat_range(size):
+    import utils
+    repeats = _counts(size).values
+    return lambda: [c for c in utils.iter_repeat_range(repeats, chunk_size=10000)]
+
+@benchmark('utils.RepeatedArray.getitem')
+def utils_repeated_array_getitem(size):
+    import utils
+    rep = utils.RepeatedArray.from_agg_count(_counts(size))
+    positions = np.random.randint(0, len(rep), 1000)
+    return lambda: rep[positions]
+
+@benchmark('utils.equal_multiple')
+def utils_equal_multiple(size):
+    import utils
+    arrays = [np.arange(size)] * 5
+    return lambda: utils.equal_multiple(*arrays)
+
+@benchmark('utils.flatten_multiindex')
+def utils_flatten_multiindex(size):
+    import utils
+    index = pd.MultiIndex.from_product(
+        [['col%d' % i for i in range(size // 100 + 1)],
+         ['mean', 'std', 'min', 'max'], list(ascii_lowercase[:25])])
+    return lambda: utils.flatten_multiindex(index)
+
+@benchmark('utils.unflatten_multiindex')
+def utils_unflatten_multiindex(size):
+    import utils
+    index = pd.MultiIndex.from_product(
+        [['col%d' % i for i in range(size // 100 + 1)],
+         ['mean', 'std', 'min', 'max'], list(ascii_lowercase[:25])])
+    flat = utils.flatten_multiindex(index)
+    return lambda: utils.unflatten_multiindex(flat)
+
+#histcomp
+
+@benchmark('histcomp.HistogramCompressor.fit')
+def histcomp_fit(size):
+    from histcomp import HistogramCompressor
+    values = pd.Series(np.random.randn(size))
+    return lambda: HistogramCompressor().fit(values)
+
+@benchmark('histcomp.HistogramCompressor.batch_update')
+def histcomp_batch_update(size):
+    from histcomp import HistogramCompressor
+    values = pd.Series(np.random.randn(size))
+    #update loop is slow, size of update is limited
+    update = pd.Series(np.random.randn(min(size, 1000)))
+    def batch_update():
+        compressor = HistogramCompressor()
+        compressor.fit(values)
+        compressor.batch_update(update)
+    return batch_update
+
+@benchmark('histcomp.HistogramCompressor.quantile')
+def histcomp_quantile(size):
+    from histcomp import HistogramCompressor
+    compressor = HistogramCompressor()
+    compressor.fit(pd.Series(np.random.randn(size)))
+    return lambda: compressor.quantile(0.75)
+
+#stdcomp
+
+@benchmark('stdcomp.StdCompressor.fit')
+def stdcomp_fit(size):
+    from stdcomp import StdCompressor
+    df = _timeseries(size, columns=10)
+    return lambda: StdCompressor().fit(df)
+
+@benchmark('stdcomp.StdCompressor.fit_warm_start')
+def stdcomp_fit_warm_start(size):
+    from stdcomp import StdCompressor
+    df = _timeseries(size, columns=10)
+    compressor = StdCompressor()
+    compressor.fit(df)
+    return lambda: compressor.fit(df, warm_start=True)
+
+#outliers
+
+@benchmark('outliers.IQRClassifier.fit_predict')
+def outliers_fit_predict(size):
+    from outliers import IQRClassifier
+    series = _timeseries(size)
+    return lambda: IQRClassifier().fit_predict(series)
+
+@benchmark('outliers.IQRClassifier.predict')
+def outliers_predict(size):
+    from outliers import IQRClassifier
+    series = _timeseries(size)
+    classifier = IQRClassifier()
+    classifier.fit_predict(series)
+    return lambda: classifier.predict(series)
+
+@benchmark('outliers.IQRClassifier.fit_predict_warm_start.mergedigest')
+def outliers_fit_predict_mergedigest(size):
+    from outliers import IQRClassifier
+    series = _timeseries(size)
+    classifier = IQRClassifier(method='mergedigest')
+    classifier.fit_predict(series)
+    return lambda: classifier.fit_predict(series, warm_start=True)
+
+#mergedigest
+
+@benchmark('mergedigest.MergingDigest.batch_update')
+def mergedigest_batch_update(size):
+    from mergedigest import MergingDigest
+    values = np.random.randn(size)
+    def batch_update():
+        digest = MergingDigest()
+        digest.batch_update(values)
+        digest.compress()
+    return batch_update
+
+@benchmark('mergedigest.MergingDigest.quantile')
+def mergedigest_quantile(size):
+    from mergedigest import MergingDigest
+    digest = MergingDigest()
+    digest.batch_update(np.random.randn(size))
+    return lambda: digest.quantile([0.25, 0.5, 0.75])
+
+@benchmark('outliers.minmax_decimate')
+def outliers_minmax_decimate(size):
+    from outliers import minmax_decimate
+    series = _timeseries(size)
+    return lambda: minmax_decimate(series, 2000)
+
+@benchmark('outliers.iqr_outlier_mask')
+def outliers_iqr_outlier_mask(size):
+    from outliers import iqr_outlier_mask
+    series = _timeseries(size)
+    return lambda: iqr_outlier_mask(series, 0.5, 0.5, 2)
+
+@benchmark('outliers.plot_outliers')
+def outliers_plot_outliers(size):
+    import matplotlib
+    matplotlib.use('Agg')
+    import matplotlib.pyplot as plt
+    from outliers import plot_outliers
+    series = _timeseries(size)
+    outlier_mask = series > 0.99
+    def plot():
+        plot_outliers(series, outlier_mask)
+        plt.close('all')
+    return plot
+
+#utils.get_related_df and upsert.GroupTable.upsert are not benchmarked:
+#both fail with NameError on undefined names before doing any work
+
+#snapshots
+
+@benchmark('snapshot.IQRClassifier.save')
+def snapshot_save(size):
+    import tempfile
+    from outliers import IQRClassifier
+    classifier = IQRClassifier()
+    classifier.fit_predict(_timeseries(size))
+    tmp = tempfile.TemporaryDirectory()
+    save = lambda: classifier.save(tmp.name)
+    save.cleanup = tmp.cleanup
+    return save
+
+@benchmark('snapshot.IQRClassifier.load')
+def snapshot_load(size):
+    import tempfile
+    from outliers import IQRClassifier
+    classifier = IQRClassifier()
+    classifier.fit_predict(_timeseries(size))
+    tmp = tempfile.TemporaryDirectory()
+    classifier.save(tmp.name)
+    load = lambda: IQRClassifier.load(tmp.name)
+    load.cleanup = tmp.cleanup
+    return load
+
+#import time
+
+CORE_MODULES = ['utils', 'histcomp', 'stdcomp', 'mergedigest', 'outliers', 'upsert',
+                'pyspark_utils', 'shortcuts', 'profiling', 'snapshot']
+
+#library modules are importable in subprocess regardless of working directory
+PACKAGE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+def _import_module(module):
+    code = 'import %s' % module
+    return lambda: subprocess.run([sys.executable, '-c', code], cwd=PACKAGE_DIR, check=True)
+
+@benchmark('import.python', sized=False, memory=False)
+def import_python():
+    return lambda: subprocess.run([sys.executable, '-c', 'pass'], cwd=PACKAGE_DIR, check=True)
+
+@benchmark('import.numpy_pandas', sized=False, memory=False)
+def import_numpy_pandas():
+    return _import_module('numpy, pandas')
+
+@benchmark('import.core', sized=False, memory=False)
+def import_core():
+    return _import_module(', '.join(CORE_MODULES))
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=DEFAULT_SIZES)
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--filter', default=None,
+                        help='run only benchmarks with name containing substring')
+    parser.add_argument('--output', default=None, help='path of JSON results')
+    parser.add_argument('--baseline', default=None, help='path of JSON baseline')
+    parser.add_argument('--save-baseline', action='store_true',
+                        help='write results to baseline instead of comparing')
+    parser.add_argument('--threshold', type=float, default=0.2,
+                        help='allowed relative increase of time or memory')
+    args = parser.parse_args(argv)
+
+    results = run(args.sizes, repeat=args.repeat, name_filter=args.filter)
+    report = {'environment': environment(), 'results': results}
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=1)
+
+    if args.baseline and args.save_baseline:
+        with open(args.baseline, 'w') as f:
+            json.dump(report, f, indent=1)
+
+    elif args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline['results'], args.threshold)
+        for key, metric, base, value in regressions:
+            change = '%+.1f%%' % ((value / base - 1) * 100) if base else '%+g' % (value - base)
+            print('REGRESSION %s %s: %g -> %g (%s)' % (key, metric, base, value, change))
+        if regressions:
+            return 1
+
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
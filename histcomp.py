@@ -1,6 +1,9 @@
 import numpy as np
 import pandas as pd
 
+from profiling import instrument
+import snapshot
+
 class HistogramCompressor:
     def __init__(self, bins=1000):
     #TODO only existing values in bins
@@ -14,6 +17,7 @@ class HistogramCompressor:
         '''
         self.bins = bins
     
+    @instrument()
     def fit(self, values):
         '''
         Build histogram for values.
@@ -46,6 +50,7 @@ class HistogramCompressor:
         upper_margin = self.hist.loc[greater_mask].index[0]
         self.hist[upper_margin] += 1
         
+    @instrument()
     def batch_update(self, values):
         #TODO performance test for
         #pd.Series(a).groupby(pd.cut(a, bins=hist.index)).count()
@@ -57,6 +62,7 @@ class HistogramCompressor:
         for v in values.values:
             self.update(v)
         
+    @instrument()
     def quantile(self, q):
         '''
         Calculate quantile from histogram
@@ -66,3 +72,32 @@ class HistogramCompressor:
         cdf = self.hist.cumsum() / self.hist.sum()
         quantile = cdf[cdf < q].index[-1]
         return quantile
+
+    def save(self, path):
+        '''
+        Save histogram to snapshot directory.
+        path: str
+        '''
+        snapshot.save_snapshot(self, path)
+    
+    @classmethod
+    def load(cls, path, mmap_mode='c'):
+        '''
+        Load HistogramCompressor from snapshot directory.
+        path: str
+        mmap_mode: see snapshot.load_snapshot
+        '''
+        return snapshot.load_snapshot(path, mmap_mode=mmap_mode, expected=cls)
+    
+    def _get_state(self):
+        arrays = {}
+        if hasattr(self, 'hist'):
+            arrays = {'counts': self.hist.values, 'edges': self.hist.index.values}
+        return {'bins': self.bins}, arrays
+    
+    @classmethod
+    def _from_state(cls, meta, arrays):
+        compressor = cls(bins=meta['bins'])
+        if 'counts' in arrays:
+            compressor.hist = pd.Series(arrays['counts'], index=arrays['edges'], copy=False)
+        return compressor
@@ -0,0 +1,210 @@
+import numpy as np
+
+from profiling import instrument
+import snapshot
+
+class MergingDigest:
+    '''Array-backed merging t-digest for streaming quantiles.
+
+    Incoming values are buffered and compressed in bulk: buffer and centroids
+    are sorted together and neighbouring points are merged into clusters,
+    whose size is bounded by arcsine scale function. Clusters are small near
+    tails, so extreme quantiles are more accurate than central ones.
+    '''
+
+    def __init__(self, delta=100, buffer_size=None):
+        '''
+        Parameters
+        ----------
+        delta : float
+        Compression, number of centroids is about delta / 2.
+
+        buffer_size : int, optional
+        Number of buffered values triggering compression, default 10 * delta.
+        '''
+        self.delta = delta
+        self.buffer_size = buffer_size or int(10 * delta)
+        self.means = np.empty(0)
+        self.weights = np.empty(0)
+        self.min = np.inf
+        self.max = -np.inf
+        self._buffer = []
+        self._buffered = 0
+
+    @property
+    def n(self):
+        '''Total weight of added values.'''
+        self.compress()
+        return self.weights.sum()
+
+    def __len__(self):
+        '''Number of centroids.'''
+        self.compress()
+        return self.means.size
+
+    def update(self, value, weight=1):
+        '''
+        Add single value.
+        value: numeric
+        weight: numeric
+        '''
+        self.batch_update(np.array([value], dtype=float), weight)
+
+    @instrument()
+    def batch_update(self, values, weights=1):
+        '''
+        Add array of values.
+
+        Parameters
+        ----------
+        values : 1d array-like or pd.Series of numeric
+        NaN values are ignored.
+
+        weights : numeric or 1d array-like with same length as values
+        '''
+        values = np.asarray(values, dtype=float)
+        mask = ~np.isnan(values)
+        if np.ndim(weights):
+            weights = np.asarray(weights, dtype=float)[mask]
+        elif weights != 1:
+            weights = np.full(mask.sum(), weights, dtype=float)
+        else:
+            #unit weights are not stored
+            weights = None
+        values = values[mask]
+        if not values.size:
+            return
+
+        self.min = min(self.min, values.min())
+        self.max = max(self.max, values.max())
+        self._buffer.append((values, weights))
+        self._buffered += values.size
+        if self._buffered >= self.buffer_size:
+            self.compress()
+
+    def merge(self, other):
+        '''
+        Add centroids of other digest.
+
+        Parameters
+        ----------
+        other : MergingDigest
+
+        Returns
+        -------
+        self : MergingDigest
+        '''
+        other.compress()
+        if other.means.size:
+            self.min = min(self.min, other.min)
+            self.max = max(self.max, other.max)
+            self._buffer.append((other.means, other.weights))
+            self._buffered += other.means.size
+            self.compress()
+        return self
+
+    def __add__(self, other):
+        digest = MergingDigest(self.delta, self.buffer_size)
+        return digest.merge(self).merge(other)
+
+    def compress(self):
+        '''Merge buffered values into centroids.'''
+        if not self._buffer:
+            return
+
+        unit = [v for v, w in self._buffer if w is None]
+        weighted = [(v, w) for v, w in self._buffer if w is not None]
+        self._buffer = []
+        self._buffered = 0
+
+        #values with unit weights are sorted without argsort,
+        #centroids and weighted values are inserted into them
+        unit_means = np.sort(np.concatenate(unit)) if unit else np.empty(0)
+        means = np.concatenate([self.means] + [v for v, _ in weighted])
+        weights = np.concatenate([self.weights] + [w for _, w in weighted])
+        order = np.argsort(means, kind='stable')
+        means, weights = means[order], weights[order]
+
+        positions = np.searchsorted(unit_means, means)
+        means = np.insert(unit_means, positions, means)
+        weights = np.insert(np.ones(unit_means.size), positions, weights)
+
+        #cluster of point is integer part of scale function at point's center,
+        #clusters are contiguous since scale function is increasing
+        cum_weights = weights.cumsum()
+        total = cum_weights[-1]
+        q = (cum_weights - weights / 2) / total
+        k = self.delta / (2 * np.pi) * np.arcsin(2 * q - 1)
+        labels = np.floor(k)
+        starts = np.flatnonzero(np.diff(labels, prepend=-np.inf))
+
+        self.weights = np.add.reduceat(weights, starts)
+        self.means = np.add.reduceat(means * weights, starts) / self.weights
+
+    @instrument()
+    def quantile(self, q):
+        '''
+        Estimate quantiles.
+
+        Parameters
+        ----------
+        q : float or 1d array-like of float
+        From 0 to 1.
+
+        Returns
+        -------
+        quantile : float or 1d np.ndarray
+        '''
+        self.compress()
+        if not self.means.size:
+            raise ValueError('quantile of empty digest')
+
+        q = np.asarray(q, dtype=float)
+        if np.any((q < 0) | (q > 1)):
+            raise ValueError('quantiles must be in range [0, 1]')
+
+        #centroids are placed at centers of their weight,
+        #min and max are placed at borders
+        centers = self.weights.cumsum() - self.weights / 2
+        positions = np.concatenate([[0], centers, [centers[-1] + self.weights[-1] / 2]])
+        values = np.concatenate([[self.min], self.means, [self.max]])
+        return np.interp(q * self.weights.sum(), positions, values)
+
+    def percentile(self, p):
+        '''
+        Estimate percentiles, compatible with tdigest.TDigest.
+        p: float or 1d array-like of float
+        From 0 to 100.
+        '''
+        return self.quantile(np.asarray(p) / 100)
+
+    def save(self, path):
+        '''
+        Save centroids to snapshot directory.
+        path: str
+        '''
+        snapshot.save_snapshot(self, path)
+
+    @classmethod
+    def load(cls, path, mmap_mode='c'):
+        '''
+        Load MergingDigest from snapshot directory.
+        path: str
+        mmap_mode: see snapshot.load_snapshot
+        '''
+        return snapshot.load_snapshot(path, mmap_mode=mmap_mode, expected=cls)
+
+    def _get_state(self):
+        self.compress()
+        meta = {'delta': self.delta, 'buffer_size': self.buffer_size,
+                'min': float(self.min), 'max': float(self.max)}
+        return meta, {'means': self.means, 'weights': self.weights}
+
+    @classmethod
+    def _from_state(cls, meta, arrays):
+        digest = cls(delta=meta['delta'], buffer_size=meta['buffer_size'])
+        digest.min = meta['min']
+        digest.max = meta['max']
+        digest.means = arrays['means']
+        digest.weights = arrays['weights']
+        return digest
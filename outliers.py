@@ -1,7 +1,9 @@
 import numpy as np
 import pandas as pd
-from tdigest import TDigest
 from histcomp import HistogramCompressor
+from mergedigest import MergingDigest
+from profiling import instrument
+import snapshot
 
 class IQRClassifier:
     '''Interquantile range classifier'''
@@ -12,12 +14,14 @@ class IQRClassifier:
         ---------
         n_iqr: float
         method: str
-        'histcomp' or 'tdigest' algorithm for streaming quantiles
+        'histcomp', 'tdigest' or 'mergedigest' algorithm for streaming quantiles.
+        'mergedigest' is built-in vectorized t-digest, 'tdigest' requires tdigest package.
         
         '''
         self.n_iqr = n_iqr
         self.method = method
     
+    @instrument()
     def fit_predict(self, df, warm_start=False):
         #TODO df ->  x
         '''
@@ -59,8 +63,13 @@ class IQRClassifier:
             self.compressor.fit(df)
             
         elif self.method == 'tdigest':
+            from tdigest import TDigest
             self.compressor=TDigest()
             self.compressor.batch_update(df)
+            
+        elif self.method == 'mergedigest':
+            self.compressor=MergingDigest()
+            self.compressor.batch_update(df)
 
     def __update__(self, values):
         '''
@@ -77,6 +86,11 @@ class IQRClassifier:
             self.median = self.compressor.percentile(50)
             self.iqr = self.compressor.percentile(75) - self.compressor.percentile(25)
             
+        elif self.method == 'mergedigest':
+            q25, self.median, q75 = self.compressor.quantile([0.25, 0.5, 0.75])
+            self.iqr = q75 - q25
+            
+    @instrument()
     def predict(self, df):
         '''
         Returns outlier mask without update classifier
@@ -92,7 +106,62 @@ class IQRClassifier:
         outlier_mask = df > (self.median + self.n_iqr * self.iqr)
         outlier_mask |= df < (self.median - self.n_iqr * self.iqr)
         return outlier_mask
+    
+    def save(self, path):
+        '''
+        Save fitted classifier to snapshot directory.
+        path: str
+        '''
+        snapshot.save_snapshot(self, path)
+    
+    @classmethod
+    def load(cls, path, mmap_mode='c'):
+        '''
+        Load IQRClassifier from snapshot directory.
+        path: str
+        mmap_mode: see snapshot.load_snapshot
+        '''
+        return snapshot.load_snapshot(path, mmap_mode=mmap_mode, expected=cls)
+    
+    def _get_state(self):
+        meta = {'n_iqr': self.n_iqr, 'method': self.method, 'fitted': hasattr(self, 'median')}
+        arrays = {}
+        if not meta['fitted']:
+            return meta, arrays
+        
+        meta['median'] = float(self.median)
+        meta['iqr'] = float(self.iqr)
+        if self.method == 'tdigest':
+            #third-party TDigest is stored as centroid arrays
+            state = self.compressor.to_dict()
+            meta['compressor'] = {'delta': state['delta'], 'K': state['K']}
+            arrays['compressor.means'] = np.array([c['m'] for c in state['centroids']], dtype=float)
+            arrays['compressor.counts'] = np.array([c['c'] for c in state['centroids']], dtype=float)
+        else:
+            meta['compressor'], compressor_arrays = snapshot.dump_state(self.compressor)
+            arrays.update(snapshot.nest_arrays('compressor', compressor_arrays))
+        return meta, arrays
+    
+    @classmethod
+    def _from_state(cls, meta, arrays):
+        classifier = cls(n_iqr=meta['n_iqr'], method=meta['method'])
+        if not meta['fitted']:
+            return classifier
+        
+        classifier.median = meta['median']
+        classifier.iqr = meta['iqr']
+        compressor_arrays = snapshot.unnest_arrays('compressor', arrays)
+        if meta['method'] == 'tdigest':
+            from tdigest import TDigest
+            classifier.compressor = TDigest(delta=meta['compressor']['delta'], K=meta['compressor']['K'])
+            classifier.compressor.update_from_dict({'centroids': [
+                {'m': m, 'c': c} for m, c in zip(compressor_arrays['means'].tolist(),
+                                                 compressor_arrays['counts'].tolist())]})
+        else:
+            classifier.compressor = snapshot.restore_state(meta['compressor'], compressor_arrays)
+        return classifier
 
+@instrument()
 def iqr_outlier_mask(df, median, iqr, n_iqr):
         '''
         Returns outlier mask.
@@ -113,15 +182,58 @@ def iqr_outlier_mask(df, median, iqr, n_iqr):
         outlier_mask |= df < (median - n_iqr * iqr)
         return outlier_mask
     
-def plot_outliers(series, outlier_mask, **kwargs):
+def minmax_decimate(series, n_bins):
+    '''
+    Positions of minimal and maximal value of series in each of n_bins
+    equal intervals of index (pixels), NaN values are dropped.
+    
+    Parameters
+    ----------
+    series: pd.Series of numeric with numeric or pd.DatetimeIndex
+    Other index types are binned by position.
+    n_bins: int
+    
+    Returns
+    ---------
+    positions: 1d np.ndarray of int
+    Sorted positions of series, at most 2 * n_bins.
+    '''
+    values = series.values
+    index = series.index
+    if isinstance(index, pd.DatetimeIndex):
+        x = index.asi8.astype(float)
+    elif pd.api.types.is_numeric_dtype(index):
+        x = index.values.astype(float)
+    else:
+        x = np.arange(len(series), dtype=float)
+    
+    valid = np.flatnonzero(~np.isnan(values))
+    if not valid.size:
+        return valid
+    x = x[valid]
+    span = x.max() - x.min()
+    bins = ((x - x.min()) / span * n_bins).astype(int) if span else np.zeros(x.size, int)
+    bins = np.minimum(bins, n_bins - 1)
+    
+    grouped = pd.Series(values[valid]).groupby(bins)
+    extremes = np.concatenate([grouped.idxmin().values, grouped.idxmax().values])
+    return valid[np.unique(extremes)]
+
+def plot_outliers(series, outlier_mask, max_points=4000, ax=None, **kwargs):
     
     '''
     Draws outliers plot of timeseries.
+    Inliers are decimated to max_points by min/max per pixel,
+    all outliers are drawn as scatter layer.
     
     Parameters
     ----------
     series: pd.Series of float with pd.DatetimeIndex
     outlier_mask: pd.Series of bool with same index as series
+    Aligned with series by index, missing labels are inliers.
+    max_points: int or None
+    Maximal number of drawn inlier points, None disables decimation.
+    ax: matplotlib Axes, optional
     **kwargs argument of pd.Series.plot()
     
     Returns
@@ -129,6 +241,17 @@ def plot_outliers(series, outlier_mask, **kwargs):
     None
     
     '''
-    series[~outlier_mask].reindex(index=series.index).plot(**kwargs)
-    series[outlier_mask].reindex(index=series.index).plot(**kwargs)
+    import matplotlib.pyplot as plt
+    
+    mask = outlier_mask.reindex(series.index, fill_value=False).values.astype(bool)
+    inliers = series[~mask]
+    if max_points is not None and len(inliers) > max_points:
+        inliers = inliers.iloc[minmax_decimate(inliers, max_points // 2)]
+    outliers = series[mask]
+    
+    if ax is None:
+        ax = plt.gca()
+    #matplotlib date units for index, so scatter shares x axis with line
+    inliers.plot(ax=ax, x_compat=True, **kwargs)
+    ax.scatter(outliers.index, outliers.values, color='red', s=9, zorder=3)
     plt.show()
@@ -0,0 +1,249 @@
+'''Opt-in instrumentation of library functions.
+
+Instrumented functions record call count, wall time, rows processed and
+allocated bytes in the in-process registry. Instrumentation is disabled by
+default and costs a single flag check per call.
+
+Enable with environment variable before import:
+REUSABLE_PROFILE=1 (time and rows) or REUSABLE_PROFILE=memory (also bytes).
+
+Or with context manager:
+>>> with profiling(memory=True):
+...     clf.fit_predict(series)
+>>> print(registry.to_frame())
+'''
+from functools import wraps
+import json
+import os
+import threading
+import time
+import tracemalloc
+
+_env = os.environ.get('REUSABLE_PROFILE', '').lower()
+_enabled = _env not in ('', '0', 'false', 'no')
+_trace_memory = _env == 'memory'
+
+#stack of memory frames of nested instrumented calls for each thread
+_local = threading.local()
+
+class CallStats:
+    '''Aggregated statistics of calls of single function.'''
+    __slots__ = ('calls', 'total_time', 'max_time', 'rows', 'bytes')
+
+    def __init__(self):
+        self.calls = 0
+        self.total_time = 0.
+        self.max_time = 0.
+        self.rows = 0
+        self.bytes = 0
+
+    def to_dict(self):
+        return {
+            'calls': self.calls,
+            'total_time': self.total_time,
+            'mean_time': self.total_time / self.calls if self.calls else 0.,
+            'max_time': self.max_time,
+            'rows': self.rows,
+            'bytes': self.bytes,
+        }
+
+class Registry:
+    '''Storage of CallStats by function name.'''
+
+    def __init__(self):
+        self.stats = {}
+        self._lock = threading.Lock()
+
+    def record(self, name, elapsed, rows=0, nbytes=0):
+        '''
+        Add single call to statistics.
+
+        Parameters
+        ----------
+        name : str
+        elapsed : float
+        Wall time in seconds.
+        rows : int
+        nbytes : int
+        Peak allocated bytes during call.
+        '''
+        with self._lock:
+            stats = self.stats.get(name)
+            if stats is None:
+                stats = self.stats[name] = CallStats()
+            stats.calls += 1
+            stats.total_time += elapsed
+            stats.max_time = max(stats.max_time, elapsed)
+            stats.rows += rows
+            stats.bytes += nbytes
+
+    def reset(self):
+        with self._lock:
+            self.stats.clear()
+
+    def to_dict(self):
+        with self._lock:
+            return {name: stats.to_dict() for name, stats in self.stats.items()}
+
+    def to_json(self, path=None):
+        '''
+        Dump statistics to JSON.
+
+        Parameters
+        ----------
+        path : str, optional
+        If given, JSON is written to file.
+
+        Returns
+        -------
+        str
+        '''
+        dump = json.dumps(self.to_dict(), indent=1)
+        if path is not None:
+            with open(path, 'w') as f:
+                f.write(dump)
+        return dump
+
+    def to_frame(self):
+        '''
+        Statistics as table sorted by total time.
+
+        Returns
+        -------
+        pd.DataFrame
+        '''
+        import pandas as pd
+        columns = list(CallStats().to_dict())
+        df = pd.DataFrame.from_dict(self.to_dict(), orient='index', columns=columns)
+        return df.sort_values('total_time', ascending=False)
+
+registry = Registry()
+
+def is_enabled():
+    return _enabled
+
+def enable(memory=False):
+    '''
+    Enable instrumentation.
+
+    Parameters
+    ----------
+    memory : bool
+    Trace allocated bytes with tracemalloc, slows down instrumented calls.
+    '''
+    global _enabled, _trace_memory
+    _enabled = True
+    _trace_memory = memory
+
+def disable():
+    global _enabled, _trace_memory
+    _enabled = False
+    _trace_memory = False
+
+class profiling:
+    '''Context manager enabling instrumentation inside its block.'''
+
+    def __init__(self, memory=False, reset=False):
+        '''
+        Parameters
+        ----------
+        memory : bool
+        Trace allocated bytes with tracemalloc.
+        reset : bool
+        Clear registry on enter.
+        '''
+        self.memory = memory
+        self.reset = reset
+
+    def __enter__(self):
+        self._previous = (_enabled, _trace_memory)
+        self._was_tracing = tracemalloc.is_tracing()
+        if self.reset:
+            registry.reset()
+        enable(memory=self.memory)
+        return registry
+
+    def __exit__(self, *exc):
+        global _enabled, _trace_memory
+        _enabled, _trace_memory = self._previous
+        if self.memory and not self._was_tracing and not _trace_memory:
+            tracemalloc.stop()
+
+def count_rows(args):
+    '''
+    Number of rows of first array-like argument.
+
+    Parameters
+    ----------
+    args : tuple
+    Positional arguments of instrumented call.
+
+    Returns
+    -------
+    int
+    '''
+    for arg in args:
+        shape = getattr(arg, 'shape', None)
+        if isinstance(shape, tuple) and shape:
+            return shape[0]
+    return 0
+
+def _memory_enter():
+    '''Start memory frame of call, returns current traced memory.'''
+    if not tracemalloc.is_tracing():
+        tracemalloc.start()
+    stack = getattr(_local, 'stack', None)
+    if stack is None:
+        stack = _local.stack = []
+
+    current, peak = tracemalloc.get_traced_memory()
+    #keep peak of outer call before reset
+    if stack:
+        stack[-1][1] = max(stack[-1][1], peak)
+    tracemalloc.reset_peak()
+    stack.append([current, 0])
+    return current
+
+def _memory_exit():
+    '''Finish memory frame of call, returns peak allocated bytes.'''
+    stack = _local.stack
+    start, carried_peak = stack.pop()
+    peak = max(tracemalloc.get_traced_memory()[1], carried_peak)
+    if stack:
+        stack[-1][1] = max(stack[-1][1], peak)
+    return peak - start
+
+def instrument(name=None, rows=None):
+    '''
+    Decorator recording calls of function to registry when enabled.
+
+    Parameters
+    ----------
+    name : str, optional
+    Registry key, default is function qualified name.
+    rows : callable, optional
+    Takes call arguments and returns number of rows processed.
+    Default is length of first array-like positional argument.
+    '''
+    def decorator(func):
+        key = name or '%s.%s' % (func.__module__, func.__qualname__)
+
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            if not _enabled:
+                return func(*args, **kwargs)
+
+            memory = _trace_memory
+            if memory:
+                _memory_enter()
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                elapsed = time.perf_counter() - start
+                nbytes = _memory_exit() if memory else 0
+                n = rows(*args, **kwargs) if rows is not None else count_rows(args)
+                registry.record(key, elapsed, n, nbytes)
+
+        return wrapper
+    return decorator
@@ -1,11 +1,17 @@
-from pyspark.sql import DataFrame, Column
-from pyspark.sql import functions as F
+from __future__ import annotations
+
+from typing import TYPE_CHECKING
+
+#pyspark is imported on first call, annotations are not evaluated
+if TYPE_CHECKING:
+    from pyspark.sql import DataFrame, Column
 
 def agg_entropy(
     df: DataFrame,
     group_columns: list[str] | list[Column],
     category_column: str | Column
     ) -> DataFrame:
+    from pyspark.sql import functions as F
     
     category_agg = df.groupby(group_columns, category_column).count()
     group_agg = (
@@ -1,3 +1,11 @@
 import pandas as pd
-from functools import partial
-pd.DataFrame.i_ = partial(pd.DataFrame.set_index, drop=False)
+from functools import partialmethod
+
+def register():
+    '''Add shortcut methods to pandas objects.
+    
+    Not applied on import, so importing the library does not patch pandas.
+    
+    df.i_(keys) : df.set_index(keys, drop=False)
+    '''
+    pd.DataFrame.i_ = partialmethod(pd.DataFrame.set_index, drop=False)
@@ -0,0 +1,169 @@
+'''Snapshots of fitted state of compressors and classifiers.
+
+Snapshot is a directory with one .npy file per array and meta.json header:
+format version, class of object and its scalar state. Arrays are loaded
+memory-mapped, so loading time does not depend on state size.
+
+Objects provide state with methods
+_get_state(self) -> (meta: dict, arrays: dict of np.ndarray)
+_from_state(cls, meta, arrays) -> object
+'''
+import importlib
+import json
+import os
+
+import numpy as np
+
+FORMAT_VERSION = 1
+META_FILE = 'meta.json'
+
+#classes which can be restored, snapshot never imports other modules
+SNAPSHOT_CLASSES = {
+    'histcomp.HistogramCompressor',
+    'stdcomp.StdCompressor',
+    'mergedigest.MergingDigest',
+    'outliers.IQRClassifier',
+}
+
+def class_path(cls):
+    return '%s.%s' % (cls.__module__, cls.__qualname__)
+
+def dump_state(obj):
+    '''
+    State of object with its class for nesting in other state.
+
+    Returns
+    -------
+    meta : dict
+    arrays : dict of np.ndarray
+    '''
+    meta, arrays = obj._get_state()
+    meta = dict(meta, **{'class': class_path(type(obj))})
+    return meta, arrays
+
+def restore_state(meta, arrays):
+    '''Inverse of dump_state.'''
+    if meta['class'] not in SNAPSHOT_CLASSES:
+        raise ValueError('snapshot of unsupported class %s' % meta['class'])
+    module, name = meta['class'].rsplit('.', 1)
+    cls = getattr(importlib.import_module(module), name)
+    return cls._from_state(meta, arrays)
+
+def nest_arrays(prefix, arrays):
+    '''Add prefix to keys of arrays of nested state.'''
+    return {'%s.%s' % (prefix, k): v for k, v in arrays.items()}
+
+def unnest_arrays(prefix, arrays):
+    '''Select arrays of nested state and remove prefix from keys.'''
+    start = len(prefix) + 1
+    return {k[start:]: v for k, v in arrays.items() if k.startswith(prefix + '.')}
+
+def index_to_arrays(index, prefix):
+    '''
+    Labels of index as arrays, one per level.
+
+    Parameters
+    ----------
+    index : pd.Index or pd.MultiIndex
+    Levels of str, numeric, bool or timezone-naive datetime values.
+    prefix : str
+    Prefix of array keys.
+
+    Returns
+    -------
+    names : list
+    Names of levels.
+    arrays : dict of np.ndarray
+    '''
+    import pandas as pd
+
+    arrays = {}
+    for i in range(index.nlevels):
+        level = index.get_level_values(i)
+        kind = pd.api.types.infer_dtype(level, skipna=False)
+        if kind == 'string':
+            values = np.array(level.tolist(), dtype=str)
+        elif kind in ('integer', 'floating', 'boolean', 'datetime64') \
+                and level.to_numpy().dtype != object:
+            values = level.to_numpy()
+        else:
+            raise TypeError('index labels of type %s are not supported in snapshot' % kind)
+        arrays['%s.%d' % (prefix, i)] = values
+    return list(index.names), arrays
+
+def index_from_arrays(names, arrays, prefix):
+    '''Inverse of index_to_arrays.'''
+    import pandas as pd
+
+    levels = [arrays['%s.%d' % (prefix, i)] for i in range(len(names))]
+    if len(levels) == 1:
+        return pd.Index(levels[0], name=names[0])
+    return pd.MultiIndex.from_arrays(levels, names=names)
+
+def save_snapshot(obj, path):
+    '''
+    Save state of object to directory.
+
+    Parameters
+    ----------
+    obj : object implementing _get_state
+    path : str
+    Directory, created if not exists. Existing snapshot is overwritten.
+    '''
+    meta, arrays = dump_state(obj)
+    #header is serialized before directory is changed, so unsupported
+    #state fails without touching existing snapshot
+    header = json.dumps({'format_version': FORMAT_VERSION, 'arrays': sorted(arrays),
+                         'state': meta})
+    os.makedirs(path, exist_ok=True)
+
+    #header is removed before arrays and written last, so interrupted save
+    #leaves directory without valid snapshot instead of mixed one
+    meta_path = os.path.join(path, META_FILE)
+    if os.path.exists(meta_path):
+        os.remove(meta_path)
+
+    #arrays may be memory-mapped from files being replaced, so each file is
+    #written to temporary file and moved into place, old file stays mapped
+    for key, arr in arrays.items():
+        arr_path = os.path.join(path, key + '.npy')
+        with open(arr_path + '.tmp', 'wb') as f:
+            np.save(f, np.ascontiguousarray(arr))
+        os.replace(arr_path + '.tmp', arr_path)
+
+    with open(meta_path + '.tmp', 'w') as f:
+        f.write(header)
+    os.replace(meta_path + '.tmp', meta_path)
+
+def load_snapshot(path, mmap_mode='c', expected=None):
+    '''
+    Load object from directory saved by save_snapshot.
+
+    Parameters
+    ----------
+    path : str
+    mmap_mode : {None, 'r', 'c', 'r+'}
+    Memory-map mode of arrays, see np.load. Default 'c' is copy-on-write:
+    object can be updated without changing the snapshot.
+    expected : type, optional
+    Raise TypeError before loading if snapshot contains other class.
+
+    Returns
+    -------
+    obj : object
+    '''
+    with open(os.path.join(path, META_FILE)) as f:
+        header = json.load(f)
+
+    version = header.get('format_version')
+    if not isinstance(version, int) or version > FORMAT_VERSION:
+        raise ValueError('unsupported snapshot format version %s, expected <= %s'
+                         % (version, FORMAT_VERSION))
+
+    if expected is not None and header['state']['class'] != class_path(expected):
+        raise TypeError('snapshot contains %s, expected %s'
+                        % (header['state']['class'], expected.__name__))
+
+    arrays = {key: np.load(os.path.join(path, key + '.npy'), mmap_mode=mmap_mode)
+              for key in header['arrays']}
+    return restore_state(header['state'], arrays)
@@ -1,5 +1,8 @@
 import pandas as pd
 
+from profiling import instrument
+import snapshot
+
 class StdCompressor:
     '''Object for storing distribution statistics for evaluating standard deviation on streaming dataframes.
     Standard deviation for each series in dataframe is stored in in .std attribute.
@@ -8,6 +11,7 @@ class StdCompressor:
     def __init__(self):
         pass
     
+    @instrument()
     def fit(self, df, warm_start=False):
         '''
         Calculate standard deviations for dataframe.
@@ -54,3 +58,37 @@ class StdCompressor:
         std = ((n * q_summ - summ ** 2) / (n * (n - 1)))**0.5
         
         return std
+
+    def save(self, path):
+        '''
+        Save statistics to snapshot directory.
+        Column labels must be str, numeric, bool or timezone-naive datetime.
+        path: str
+        '''
+        snapshot.save_snapshot(self, path)
+    
+    @classmethod
+    def load(cls, path, mmap_mode='c'):
+        '''
+        Load StdCompressor from snapshot directory.
+        path: str
+        mmap_mode: see snapshot.load_snapshot
+        '''
+        return snapshot.load_snapshot(path, mmap_mode=mmap_mode, expected=cls)
+    
+    def _get_state(self):
+        if not hasattr(self, 'count'):
+            return {'column_names': None}, {}
+        arrays = {k: getattr(self, k).values for k in ('count', 'sum', 'qsum', 'std')}
+        names, columns = snapshot.index_to_arrays(self.count.index, 'columns')
+        arrays.update(columns)
+        return {'column_names': names}, arrays
+    
+    @classmethod
+    def _from_state(cls, meta, arrays):
+        compressor = cls()
+        if meta['column_names'] is not None:
+            columns = snapshot.index_from_arrays(meta['column_names'], arrays, 'columns')
+            for k in ('count', 'sum', 'qsum', 'std'):
+                setattr(compressor, k, pd.Series(arrays[k], index=columns, copy=False))
+        return compressor
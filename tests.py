@@ -12,9 +12,255 @@ cols=list(ascii_uppercase)[:df.shape[1]]
 df=pd.DataFrame(df, index=idx, columns=cols)
 
 #columnwise_shift
-offsets=pd.Series(range(df.columns.size), index=X.columns)
-print(columnwise_shift(df, offsets, 'h').apply(lambda x: x.dropna().index.min()))
+offsets=pd.Series(range(df.columns.size), index=df.columns)
+print(utils.columnwise_shift(df, offsets, 'h').apply(lambda x: x.dropna().index.min()))
 
 #columnwise_rolling
-windows=pd.Series(range(df.columns.size), index=X.columns)
-print(columnwise_rolling(df, windows, 'mean').count())
+windows=pd.Series(range(df.columns.size), index=df.columns)
+print(utils.columnwise_rolling(df, windows, 'mean').count())
+
+#iter_repeat_range
+repeats=np.array([3, 0, 2, 5, 1])
+chunks=list(utils.iter_repeat_range(repeats, range_step=2, chunk_size=4, dtype='min'))
+assert all(c.size <= 4 for c in chunks)
+assert np.array_equal(np.concatenate(chunks), np.repeat(np.arange(repeats.size) * 2, repeats))
+print(chunks[0].dtype)
+
+#iter_inverse_agg_count
+counts=pd.Series([2, 0, 3], index=['a', 'b', 'c'])
+chunks=list(utils.iter_inverse_agg_count(counts, chunk_size=2))
+assert np.array_equal(np.concatenate(chunks), utils.inverse_agg_count(counts))
+
+#RepeatedArray
+rep=utils.RepeatedArray.from_agg_count(counts)
+full=utils.inverse_agg_count(counts)
+assert len(rep) == full.size
+assert np.array_equal(rep[[0, 2, -1]], full[[0, 2, -1]])
+assert np.array_equal(rep[1:4], full[1:4])
+assert np.array_equal(rep[::2], full[::2]) and np.array_equal(rep[::-1], full[::-1])
+print(rep.groupby_count({'a': 'x', 'b': 'x', 'c': 'y'}))
+
+#benchmarks compare
+import benchmarks
+baseline={'a[10]': {'time': 1.0, 'peak_memory': 1000000}}
+results={'a[10]': {'time': 1.5, 'peak_memory': 1000000}}
+assert benchmarks.compare(results, baseline, threshold=0.2) == [('a[10]', 'time', 1.0, 1.5)]
+assert benchmarks.compare(results, baseline, threshold=0.6) == []
+assert benchmarks.compare({'a[10]': {'error': 'ValueError: x'}}, baseline) == []
+assert benchmarks.compare({'a[10]': {'time': 1.5, 'peak_memory': None}}, baseline) == [('a[10]', 'time', 1.0, 1.5)]
+
+#profiling
+import profiling
+from histcomp import HistogramCompressor
+from stdcomp import StdCompressor
+with profiling.profiling(memory=True, reset=True) as registry:
+    compressor=HistogramCompressor()
+    compressor.fit(pd.Series(np.random.randn(1000)))
+    compressor.batch_update(pd.Series(np.random.randn(10)))
+    StdCompressor().fit(df)
+stats=registry.to_dict()
+assert stats['histcomp.HistogramCompressor.fit']['rows'] == 1000
+assert stats['stdcomp.StdCompressor.fit']['calls'] == 1
+assert stats['histcomp.HistogramCompressor.fit']['bytes'] > 0
+StdCompressor().fit(df)
+assert registry.to_dict()['stdcomp.StdCompressor.fit']['calls'] == 1
+print(registry.to_frame())
+
+#core imports only numpy and pandas
+import subprocess
+import sys
+def third_party_modules(code):
+    script = code + '''
+import sys
+print(' '.join(sorted({m.split('.')[0] for m in sys.modules} - set(sys.stdlib_module_names))))
+'''
+    out = subprocess.run([sys.executable, '-c', script], cwd=benchmarks.PACKAGE_DIR,
+                         capture_output=True, text=True, check=True)
+    return set(out.stdout.split())
+
+expected=third_party_modules('import numpy, pandas')
+imported=third_party_modules('import ' + ', '.join(benchmarks.CORE_MODULES))
+assert imported - expected == set(benchmarks.CORE_MODULES), imported - expected
+
+#shortcuts are registered explicitly
+import shortcuts
+assert not hasattr(pd.DataFrame, 'i_')
+shortcuts.register()
+assert df.reset_index().i_('index').columns[0] == 'index'
+
+#MergingDigest accuracy against exact quantiles
+from mergedigest import MergingDigest
+values=np.random.standard_exponential(100000)
+digest=MergingDigest()
+for chunk in np.array_split(values, 50):
+    digest.batch_update(chunk)
+q=np.array([0.001, 0.01, 0.25, 0.5, 0.75, 0.99, 0.999])
+rank=np.searchsorted(np.sort(values), digest.quantile(q)) / values.size
+assert np.all(np.abs(rank - q) < 0.005), rank - q
+assert np.all(np.abs(rank - q)[[0, -1]] < 0.0005), rank - q
+assert digest.quantile(0) == values.min() and digest.quantile(1) == values.max()
+
+#MergingDigest merge
+left, right=MergingDigest(), MergingDigest()
+left.batch_update(values[:50000])
+right.batch_update(values[50000:])
+merged=left + right
+assert merged.n == values.size
+rank=np.searchsorted(np.sort(values), merged.quantile(q)) / values.size
+assert np.all(np.abs(rank - q) < 0.005), rank - q
+
+#IQRClassifier mergedigest
+from outliers import IQRClassifier
+series=pd.Series(np.random.randn(10000))
+clf=IQRClassifier(method='mergedigest')
+clf.fit_predict(series)
+mask=clf.fit_predict(series, warm_start=True)
+assert abs(clf.iqr - (series.quantile(0.75) - series.quantile(0.25))) < 0.05
+assert abs(mask.mean() - IQRClassifier().fit_predict(series).mean()) < 0.005
+
+#minmax_decimate
+from outliers import minmax_decimate
+series=pd.Series(np.random.randn(100000), index=pd.date_range('2020-01-01', periods=100000, freq='s'))
+series.iloc[::1000]=np.nan
+positions=minmax_decimate(series, 500)
+assert positions.size <= 1000 and np.all(np.diff(positions) > 0)
+assert series.iloc[positions].max() == series.max() and series.iloc[positions].min() == series.min()
+assert not series.iloc[positions].isna().any()
+
+#flatten_multiindex, unflatten_multiindex
+index=pd.MultiIndex.from_product([['a', 'b'], [1, 2], pd.to_datetime(['2020-01-01', '2020-02-01'])],
+                                 names=['x', 'y', 'z'])
+flat=utils.flatten_multiindex(index)
+assert flat[0] == 'a_1_2020-01-01'
+assert flat[-1] == 'b_2_2020-02-01' and flat.is_unique
+restored=utils.unflatten_multiindex(flat, names=index.names, dtypes=[str, int, 'datetime64[ns]'])
+assert restored.equals(index) and restored.names == index.names
+assert utils.unflatten_multiindex(pd.Index(['a_b_c']), nlevels=2)[0] == ('a', 'b_c')
+assert utils.unflatten_multiindex(pd.Index(['a_b']), nlevels=1).nlevels == 1
+index=pd.MultiIndex.from_product([['a%d' % i for i in range(100)], ['b%d' % i for i in range(100)]])
+flat=utils.flatten_multiindex(index)
+assert list(flat) == ['_'.join(t) for t in index]
+
+#snapshots
+import tempfile
+from outliers import IQRClassifier
+with tempfile.TemporaryDirectory() as tmp:
+    series=pd.Series(np.random.randn(10000))
+    update=pd.Series(np.random.randn(100))
+    for method in ['histcomp', 'mergedigest']:
+        clf=IQRClassifier(method=method)
+        clf.fit_predict(series)
+        clf.save(tmp + '/' + method)
+        loaded=IQRClassifier.load(tmp + '/' + method)
+        assert loaded.median == clf.median and loaded.iqr == clf.iqr
+        assert clf.fit_predict(update, warm_start=True).equals(loaded.fit_predict(update, warm_start=True))
+        assert loaded.median == clf.median and loaded.iqr == clf.iqr
+
+    std=StdCompressor()
+    std.fit(df)
+    std.save(tmp + '/std')
+    loaded=StdCompressor.load(tmp + '/std')
+    assert isinstance(loaded.count.values, np.memmap) or loaded.count.values.base is not None
+    std.fit(df, warm_start=True)
+    loaded.fit(df, warm_start=True)
+    assert loaded.std.equals(std.std)
+    #snapshot is not changed by updates of loaded object
+    assert StdCompressor.load(tmp + '/std').count.equals(df.count())
+    #load, warm start and save to the same path
+    for method in ['histcomp', 'mergedigest']:
+        loaded=IQRClassifier.load(tmp + '/' + method)
+        loaded.fit_predict(update, warm_start=True)
+        quantiles=loaded.compressor.quantile(0.75)
+        loaded.save(tmp + '/' + method)
+        assert loaded.compressor.quantile(0.75) == quantiles
+        reloaded=IQRClassifier.load(tmp + '/' + method)
+        assert reloaded.compressor.quantile(0.75) == quantiles
+        assert reloaded.median == loaded.median and reloaded.iqr == loaded.iqr
+
+    loaded=StdCompressor.load(tmp + '/std')
+    loaded.fit(df, warm_start=True)
+    loaded.save(tmp + '/std')
+    reloaded=StdCompressor.load(tmp + '/std')
+    assert reloaded.count.equals(df.count() * 2) and reloaded.std.equals(loaded.std)
+
+    try:
+        IQRClassifier.load(tmp + '/std')
+        raise AssertionError('TypeError expected')
+    except TypeError:
+        pass
+
+#plot_outliers
+import matplotlib
+matplotlib.use('Agg')
+import matplotlib.pyplot as plt
+from outliers import plot_outliers
+series=pd.Series(np.random.randn(100000), index=pd.date_range('2020-01-01', periods=100000, freq='s'))
+outlier_mask=series.abs() > 3
+#mask is aligned by label, not position
+plot_outliers(series, outlier_mask.sample(frac=1), max_points=1000)
+ax=plt.gca()
+line_x=ax.get_lines()[0].get_xdata(orig=False).astype(float)
+scatter_x=ax.collections[0].get_offsets()[:, 0]
+assert line_x.size <= 1000
+assert len(scatter_x) == outlier_mask.sum()
+assert np.allclose(np.sort(scatter_x), matplotlib.dates.date2num(series.index[outlier_mask.values]))
+#both layers are in matplotlib date units of series range
+start, end=matplotlib.dates.date2num(series.index[[0, -1]])
+assert start <= line_x.min() and line_x.max() <= end
+assert line_x.max() - line_x.min() > 0.9 * (end - start)
+plt.close('all')
+
+#failed save keeps existing snapshot
+with tempfile.TemporaryDirectory() as tmp:
+    clf=IQRClassifier(method='mergedigest')
+    clf.fit_predict(pd.Series(np.random.randn(1000)))
+    clf.save(tmp)
+    clf.n_iqr=pd.Timestamp('2020-01-01')
+    try:
+        clf.save(tmp)
+        raise AssertionError('TypeError expected')
+    except TypeError:
+        pass
+    assert IQRClassifier.load(tmp).n_iqr == 2
+
+#StdCompressor snapshot with MultiIndex and datetime columns
+with tempfile.TemporaryDirectory() as tmp:
+    wide=pd.DataFrame(np.random.rand(50, 6), columns=pd.MultiIndex.from_product(
+        [['a', 'b'], pd.date_range('2020-01-01', periods=3)], names=['key', 'date']))
+    std=StdCompressor()
+    std.fit(wide)
+    std.save(tmp)
+    loaded=StdCompressor.load(tmp)
+    assert loaded.count.index.equals(wide.columns) and loaded.count.index.names == ['key', 'date']
+    std.fit(wide, warm_start=True)
+    loaded.fit(wide, warm_start=True)
+    assert loaded.std.equals(std.std)
+    try:
+        mixed=StdCompressor()
+        mixed.fit(pd.DataFrame(np.random.rand(5, 2), columns=['a', 1]))
+        mixed.save(tmp)
+        raise AssertionError('TypeError expected')
+    except TypeError:
+        pass
+    assert StdCompressor.load(tmp).count.index.equals(wide.columns)
+
+#snapshot restores only known classes
+import json
+with tempfile.TemporaryDirectory() as tmp:
+    MergingDigest().save(tmp)
+    with open(tmp + '/meta.json') as f:
+        header=json.load(f)
+    header['state']['class']='os.system'
+    with open(tmp + '/meta.json', 'w') as f:
+        json.dump(header, f)
+    try:
+        MergingDigest.load(tmp)
+        raise AssertionError('TypeError expected')
+    except TypeError:
+        pass
+    import snapshot
+    try:
+        snapshot.load_snapshot(tmp)
+        raise AssertionError('ValueError expected')
+    except ValueError:
+        pass
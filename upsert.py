@@ -1,6 +1,8 @@
 import sqlite3
 import pandas as pd
 
+from profiling import instrument
+
 class GroupTable:
     def __init__(self, database: str, df: pd.DataFrame, table_name: str, group_key):
 
@@ -9,6 +11,7 @@ class GroupTable:
         self.group_key = group_key
         self.table_name = table_name
 
+    @instrument(rows=lambda self: len(self.df))
     def upsert(self):
         conn = sqlite3.connect(database)
         
@@ -5,6 +5,8 @@ import hashlib
 import numpy as np
 import pandas as pd
 
+from profiling import instrument
+
 def excel_date(date):
     '''
     Converting date to Excel date or from Excel date
@@ -34,6 +36,7 @@ def excel_date(date):
     else:
         raise TypeError('expected str, datetime, float, int, got ', type(date))
 
+@instrument()
 def time_derivative(series, time_unit=pd.Timedelta('1s')):
     '''
     Calculate time derivative from right for each point in series. Ignores NaN.
@@ -61,6 +64,7 @@ def isnumber(a):
     except:
         return False
     
+@instrument()
 def convert_cyr_month(series):
     '''Convert cyrillic name of month in series to month number (i.e. 01, 02, ..., 12)
     Parameters
@@ -115,6 +119,7 @@ def read_all_sheets(add_sheet_name=True, **kwargs):
 
     return sheets
 
+@instrument()
 def timeseries_info(df):
     
     '''Timeseries start, end and frequency.
@@ -135,6 +140,7 @@ def timeseries_info(df):
     freq = df.index.to_series().diff().value_counts()
     return start, end, freq
 
+@instrument()
 def bool_report(series):
     '''Returns groups of indices for bool series provided from dataframe tests.
     Parameters
@@ -147,6 +153,7 @@ def bool_report(series):
     '''
     return series.groupby(series).groups
 
+@instrument()
 def floating_filter(df, value):
     '''Find single row of dataframe by value in any column.
     df: pd.DataFrame
@@ -192,6 +199,7 @@ def get_related_df(matching, values, related_columns):
     related_df.index = val_arr[val_idx]
     return  related_df
 
+@instrument()
 def columnwise_rolling(df, windows, aggfunc, **kwargs):
     '''Rolling dataframe aggregation with individual window for each column.
     Parameters
@@ -210,6 +218,7 @@ def columnwise_rolling(df, windows, aggfunc, **kwargs):
                     .rolling(windows[x.name], **kwargs)\
                     .agg(aggfunc))
 
+@instrument()
 def columnwise_shift(df, offsets, freq):
     '''Shift each column with individual offset.
     Parameters
@@ -257,6 +266,7 @@ def recursive_flatten(list_like):
     return scalars
 
 
+@instrument()
 def hash_df(df, hashfunc=hashlib.sha1):
     '''Get hex hash of dataframe values.
     
@@ -292,6 +302,7 @@ def regroup_dict(d):
     
     return re_d
 
+@instrument()
 def subseries_count(a):
     '''
     Count subseries of True in array.
@@ -313,6 +324,7 @@ def subseries_count(a):
     subs_start_idx = np.searchsorted(marked_a, labels[mask]) + 1
     return subs_start_idx, count[mask] - 1
 
+@instrument()
 def nondecr_subarray_len(arr):
     '''Return length of non-decreasing subarrays of given array.
     Parameters
@@ -331,6 +343,7 @@ def nondecr_subarray_len(arr):
     
     return subarr_len
 
+@instrument()
 def value_subarray_len(arr, value):
     '''Find length of consecutive subseries of value in array.
     Parameters
@@ -356,6 +369,7 @@ def value_subarray_len(arr, value):
             
     return dict(subarrays)
 
+@instrument()
 def const_check(arr, ignore_nan=True):
     '''Check if all values in array are equal.
     
@@ -389,6 +403,7 @@ def make_output(flagged_outputs):
     output = [out for out, flag in flagged_outputs if flag]
     return output
 
+@instrument()
 def inverse_agg_count(series):
     '''
     Inverse count agregation.
@@ -406,7 +421,47 @@ def inverse_agg_count(series):
     '''
     return np.repeat(series.index, series)
 
-def repeat_range(repeats, range_step=1):
+def iter_inverse_agg_count(series, chunk_size=1000000):
+    '''
+    Inverse count agregation in chunks of fixed size.
+    Memory-bounded alternative to inverse_agg_count.
+    
+    Parameters
+    ----------
+    series : pd.Series with 1d index
+    Count aggregation result.
+    
+    chunk_size : int
+    Maximal length of yielded chunk.
+    
+    Yields
+    -------
+    chunk : 1d index
+    Consecutive parts of inverse_agg_count(series).
+    '''
+    for positions in iter_repeat_range(series.values, chunk_size=chunk_size,
+                                       dtype='min'):
+        yield series.index.take(positions)
+
+def min_int_dtype(min_value, max_value):
+    '''
+    Smallest integer dtype holding all values from min_value to max_value.
+    
+    Parameters
+    ----------
+    min_value : int
+    
+    max_value : int
+    
+    Returns
+    -------
+    dtype : np.dtype
+    '''
+    return np.result_type(np.min_scalar_type(min_value),
+                          np.min_scalar_type(max_value))
+
+@instrument()
+def repeat_range(repeats, range_step=1, dtype=int):
     '''
     Repeat range.
     
@@ -418,16 +473,175 @@ def repeat_range(repeats, range_step=1):
     range_step : int
     Step of sequence of integers from 0 to len(repeats).
     
+    dtype : dtype or 'min', default int
+    Dtype of result. 'min' selects smallest sufficient integer dtype.
+    
     Returns
     -------
     res : 1d np.ndarray, dtype : int
     '''
+    if isinstance(dtype, str) and dtype == 'min':
+        dtype = min_int_dtype(0, range_step * (len(repeats) - 1))
+    
     idx = repeats.cumsum()
-    res = np.zeros(idx[-1], dtype=int)
+    res = np.zeros(idx[-1], dtype=dtype)
     res[idx[:-1]] = range_step
-    res = res.cumsum()
+    res = res.cumsum(dtype=dtype)
     return res
 
+def iter_repeat_range(repeats, range_step=1, chunk_size=1000000, dtype=int):
+    '''
+    Repeat range in chunks of fixed size.
+    Memory-bounded alternative to repeat_range, zero repeats are allowed.
+    
+    Parameters
+    ----------
+    repeats : 1d np.ndarray, dtype=int
+    Number of repetitions for each element in range.
+    
+    range_step : int
+    Step of sequence of integers from 0 to len(repeats).
+    
+    chunk_size : int
+    Maximal length of yielded chunk.
+    
+    dtype : dtype or 'min', default int
+    Dtype of chunks. 'min' selects smallest sufficient integer dtype.
+    
+    Yields
+    -------
+    chunk : 1d np.ndarray
+    Consecutive parts of repeat_range(repeats, range_step).
+    '''
+    if isinstance(dtype, str) and dtype == 'min':
+        dtype = min_int_dtype(0, range_step * (len(repeats) - 1))
+    
+    repeats = np.asarray(repeats)
+    bounds = repeats.cumsum()
+    total = bounds[-1] if bounds.size else 0
+    
+    for start in range(0, total, chunk_size):
+        stop = min(start + chunk_size, total)
+        first = np.searchsorted(bounds, start, side='right')
+        last = np.searchsorted(bounds, stop - 1, side='right')
+        
+        #clip repeats of first and last element to chunk borders
+        local_repeats = repeats[first:last + 1].copy()
+        local_repeats[-1] = stop - (bounds[last - 1] if last else 0)
+        local_repeats[0] = min(bounds[first], stop) - start
+        
+        values = np.arange(first, last + 1, dtype=dtype) * range_step
+        yield np.repeat(values, local_repeats)
+
+class RepeatedArray:
+    '''Lazy array of values repeated counts times.
+    Supports positional indexing and grouping without expansion to full length.
+    '''
+    
+    def __init__(self, values, counts):
+        '''
+        Parameters
+        ----------
+        values : 1d array-like
+        
+        counts : 1d array-like of int
+        Number of repetitions for each value.
+        '''
+        self.values = np.asarray(values)
+        self.counts = np.asarray(counts)
+        self.bounds = self.counts.cumsum()
+    
+    @classmethod
+    def from_agg_count(cls, series):
+        '''
+        Lazy inverse count agregation.
+        
+        Parameters
+        ----------
+        series : pd.Series with 1d index
+        Count aggregation result.
+        
+        Returns
+        -------
+        RepeatedArray
+        '''
+        return cls(series.index, series.values)
+    
+    def __len__(self):
+        return int(self.bounds[-1]) if self.bounds.size else 0
+    
+    def __getitem__(self, key):
+        '''
+        Positional indexing by int, slice or 1d array of int.
+        '''
+        if isinstance(key, slice):
+            if key.step in (None, 1):
+                return self._slice(*key.indices(len(self))[:2])
+            positions = np.arange(*key.indices(len(self)))
+            return self.values[np.searchsorted(self.bounds, positions, side='right')]
+        
+        positions = np.asarray(key)
+        if positions.dtype == bool:
+            raise TypeError('boolean mask indexing is not supported')
+        positions = np.where(positions < 0, positions + len(self), positions)
+        if np.any((positions < 0) | (positions >= len(self))):
+            raise IndexError('index out of range')
+        
+        return self.values[np.searchsorted(self.bounds, positions, side='right')]
+    
+    def _slice(self, start, stop):
+        '''Expand only values between start and stop positions.'''
+        if stop <= start:
+            return self.values[:0]
+        first = np.searchsorted(self.bounds, start, side='right')
+        last = np.searchsorted(self.bounds, stop - 1, side='right')
+        local_counts = self.counts[first:last + 1].copy()
+        local_counts[-1] = stop - (self.bounds[last - 1] if last else 0)
+        local_counts[0] = min(self.bounds[first], stop) - start
+        return np.repeat(self.values[first:last + 1], local_counts)
+    
+    def iter_chunks(self, chunk_size=1000000):
+        '''
+        Expanded values in chunks of fixed size.
+        
+        Parameters
+        ----------
+        chunk_size : int
+        
+        Yields
+        -------
+        chunk : 1d np.ndarray
+        '''
+        for start in range(0, len(self), chunk_size):
+            yield self._slice(start, min(start + chunk_size, len(self)))
+    
+    def to_numpy(self):
+        '''Full expansion, same as inverse_agg_count.'''
+        return np.repeat(self.values, self.counts)
+    
+    def groupby_count(self, by=None):
+        '''
+        Count of expanded values in groups, computed on compressed counts.
+        
+        Parameters
+        ----------
+        by : None, mapping, callable or 1d array-like with same length as values
+        Group keys for values. If None values are used as keys.
+        
+        Returns
+        -------
+        count : pd.Series
+        Same as pd.Series(self.to_numpy()).groupby(...).count(),
+        except that values with zero count are kept.
+        '''
+        counts = pd.Series(self.counts, index=self.values)
+        if by is None:
+            return counts.groupby(level=0).sum()
+        if callable(by) or isinstance(by, dict):
+            by = pd.Index(self.values).map(by)
+        return counts.groupby(np.asarray(by)).sum()
+
+@instrument()
 def equal_multiple(*arrays):
     '''
     Compare multiple arrays.
@@ -465,9 +679,12 @@ def safe_getitem(iterable, key, default):
     except (IndexError, KeyError):
         return default
 
+@instrument()
 def flatten_multiindex(index, sep='_'):
     '''
     Flatten multiindex with joined column names.
+    Levels of any dtype are formatted as str once per unique value,
+    names are combined by level codes. Missing values are empty strings.
     
     Parameters
     ----------
@@ -479,4 +696,63 @@ def flatten_multiindex(index, sep='_'):
     -------
     pd.Index
     '''
-    return index.to_flat_index().str.join(sep)
+    #labels are unique joined names of leading levels, codes map columns to labels
+    labels = None
+    for level, level_codes in zip(index.levels, index.codes):
+        #extra last label for missing values with code -1
+        formatted = np.append(level.astype(str).to_numpy(dtype=object), '')
+        if labels is None:
+            #level codes are stored in small int types, which overflow in products
+            labels, codes = formatted, np.asarray(level_codes, dtype=np.intp)
+            continue
+        
+        pairs = codes * formatted.size + np.where(level_codes < 0, formatted.size - 1, level_codes)
+        pairs, codes = np.unique(pairs, return_inverse=True)
+        labels = labels[pairs // formatted.size] + sep + formatted[pairs % formatted.size]
+    
+    return pd.Index(labels[codes])
+
+@instrument()
+def unflatten_multiindex(index, sep='_', nlevels=None, names=None, dtypes=None):
+    '''
+    Rebuild multiindex from joined column names, inverse of flatten_multiindex.
+    
+    Parameters
+    ----------
+    index : pd.Index of str
+    
+    sep : str
+    
+    nlevels : int, optional
+    Number of levels, sep in names of last level is kept.
+    By default names are split by each sep.
+    
+    names : list of str, optional
+    Names of levels.
+    
+    dtypes : list of dtype, optional
+    Dtype of each level, conversion is applied to unique values of level.
+    
+    Returns
+    -------
+    pd.MultiIndex
+    '''
+    if nlevels == 1:
+        #str.split treats n=0 as split by each sep
+        split = pd.MultiIndex.from_arrays([pd.Index(index)])
+    else:
+        split = pd.Index(index).str.split(sep, n=nlevels - 1 if nlevels else -1, expand=True)
+        if not isinstance(split, pd.MultiIndex):
+            split = pd.MultiIndex.from_arrays([split])
+    
+    levels = []
+    codes = []
+    for i, (level, level_codes) in enumerate(zip(split.levels, split.codes)):
+        if dtypes is not None:
+            level = level.astype(dtypes[i])
+        #conversion may map different strings to same value
+        unique_codes, level = pd.factorize(level)
+        codes.append(np.where(level_codes < 0, -1, unique_codes[level_codes]))
+        levels.append(level)
+    
+    return pd.MultiIndex(levels=levels, codes=codes, names=names)